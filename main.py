@@ -1,17 +1,31 @@
 import os
 import shutil
-from fastapi import FastAPI, File, UploadFile, HTTPException, Body
+import time
+import asyncio
+import threading
+import json
+import math
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from itertools import repeat
+from fastapi import FastAPI, File, UploadFile, HTTPException, Body, BackgroundTasks
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import JSONResponse
 from supabase import create_client, Client
 from dotenv import load_dotenv
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 import logging
-from pdf2img import convert_pdf_to_images
-from visionOcr import ImageTextExtractor
+from pdf2img import convert_pdf_to_images_iter, render_page, RERENDER_DPI
+from visionOcr import ImageTextExtractor, MAX_BATCH_SIZE, needs_rerender
 from sentence_transformers import SentenceTransformer
-import requests
+import torch
+import httpx
+import numpy as np
+import orjson
 import google.generativeai as genai
+import google.api_core.exceptions
 from fastapi.middleware.cors import CORSMiddleware
 from storage3.exceptions import StorageApiError
 
@@ -45,9 +59,6 @@ if missing_vars:
 # Handle VISION_CREDENTIALS_PATH - support both file path and JSON content
 def setup_vision_credentials(credentials_path_or_json=None):
     """Setup Google Cloud Vision credentials from file path or JSON content"""
-    import tempfile
-    import json
-    
     # If no credentials provided, use default service account (cloud deployment)
     if not credentials_path_or_json:
         print("Using default service account for Vision API")
@@ -75,8 +86,25 @@ VISION_CREDENTIALS_FILE = setup_vision_credentials(VISION_CREDENTIALS_PATH)
 # Note: We'll handle timeouts at the request level since Supabase client doesn't support custom HTTP client easily
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
 
+SUPABASE_REST_HEADERS = {
+    "apikey": SUPABASE_KEY,
+    "Authorization": f"Bearer {SUPABASE_KEY}",
+    "Content-Type": "application/json"
+}
+
+# Shared async HTTP client for Supabase REST calls; keeps connections alive between requests
+http_client = httpx.AsyncClient(
+    http2=True,
+    timeout=60,  # 60 second timeout
+    limits=httpx.Limits(max_keepalive_connections=20)
+)
+
 app = FastAPI(title="PDF Chatbot Backend", debug=True)
 
+@app.on_event("shutdown")
+async def close_http_client():
+    await http_client.aclose()
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # Or specify your frontend URL(s)
@@ -92,71 +120,76 @@ async def root():
         "version": "1.0.0",
         "endpoints": {
             "upload_pdf": "/upload_pdf/",
+            "pdf_status": "/pdfs/{pdf_id}/status",
             "ask_question": "/ask/"
         }
     }
 
-def extract_text_from_pdf_images(pdf_id: str) -> list:
+@lru_cache(maxsize=1)
+def get_extractor() -> ImageTextExtractor:
+    """Return the shared Vision extractor, creating its client on first use."""
+    return ImageTextExtractor(VISION_CREDENTIALS_FILE)
+
+def available_cpus() -> int:
     """
-    Extract text from images in the 'pdfimg' bucket for a given pdf_id, upload text files to 'pdftxt' bucket.
-    Returns a list of uploaded text file paths.
+    Number of CPUs this process may actually use: the cgroup CPU quota when one is set
+    (e.g. Cloud Run vCPUs), otherwise the CPUs in the process's affinity mask.
+    os.cpu_count() alone reports the host's cores.
     """
-    import time
-    img_bucket = "pdfimg"
-    txt_bucket = "pdftxt"
-    img_folder = f"{pdf_id}"
-    # Wait for storage to sync
-    time.sleep(2)
-    # List images in the bucket
-    files = supabase.storage.from_(img_bucket).list(img_folder)
-    print("Raw list response:", files)
-    if hasattr(files, 'data'):
-        files = files.data
-    print(f"Files in bucket after upload for {pdf_id}:", files)
-    if not files:
-        logger.warning(f"No images found in bucket '{img_bucket}' for pdf_id '{pdf_id}'")
-        return []
-    # Prepare local temp dir
-    local_img_dir = f"temp_images/{pdf_id}"
-    os.makedirs(local_img_dir, exist_ok=True)
-    local_image_paths = []
-    for img in files:
-        img_name = img['name']
-        img_storage_path = f"{pdf_id}/{img_name}"
-        img_local_path = os.path.join(local_img_dir, img_name)
-        img_bytes = supabase.storage.from_(img_bucket).download(img_storage_path)
-        with open(img_local_path, "wb") as f:
-            f.write(img_bytes)
-        local_image_paths.append(img_local_path)
-    # Extract text using visionOcr.py
-    extractor = ImageTextExtractor(VISION_CREDENTIALS_FILE)
-    uploaded_texts = []
-    for img_path in local_image_paths:
-        text = extractor.extract_text_from_image(img_path)
-        txt_name = os.path.splitext(os.path.basename(img_path))[0] + "_text.txt"
-        txt_local_path = os.path.join(local_img_dir, txt_name)
-        with open(txt_local_path, "w", encoding="utf-8") as f:
-            f.write(text)
-        # Upload to pdftxt bucket
-        txt_storage_path = f"{pdf_id}/{txt_name}"
-        with open(txt_local_path, "rb") as f_txt:
-            upload_res = supabase.storage.from_(txt_bucket).upload(txt_storage_path, f_txt, file_options={"content-type": "text/plain"})
-            if getattr(upload_res, "error", None):
-                logger.error(f"Failed to upload text file {txt_name}: {upload_res.error['message']}")
-            else:
-                uploaded_texts.append(txt_storage_path)
-    # Clean up local temp files
-    shutil.rmtree(local_img_dir)
-    return uploaded_texts
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+    try:
+        # cgroup v2: "<quota> <period>" or "max <period>"
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            cpus = min(cpus, math.ceil(int(quota) / int(period)))
+    except (OSError, ValueError):
+        pass
+    return max(1, cpus)
 
-model = SentenceTransformer('all-MiniLM-L6-v2')
+# Let CPU inference use the CPUs granted to the container, unless overridden;
+# page, render and OCR workers share the same CPUs
+TORCH_NUM_THREADS = int(os.getenv("TORCH_NUM_THREADS", "0")) or available_cpus()
+torch.set_num_threads(TORCH_NUM_THREADS)
+
+EMBEDDING_DEVICE = os.getenv("EMBEDDING_DEVICE", "cpu")
+EMBEDDING_BATCH_SIZE = 32
+
+model = SentenceTransformer('all-MiniLM-L6-v2', device=EMBEDDING_DEVICE)
+if EMBEDDING_DEVICE.startswith("cuda"):
+    model.half()
+
+# Chunk size used when streaming uploaded PDFs to disk
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Page processing is dominated by storage and Vision API round-trips, so threads overlap well
+PAGE_WORKERS = 8
+
+# Page images kept on disk at once per PDF; each is deleted once it has been uploaded
+# and OCR'd. Must be at least two Vision batches so a full batch can always be submitted.
+MAX_PAGES_IN_FLIGHT = 2 * MAX_BATCH_SIZE
+
+# A PDF still 'processing' after this long is reported as failed, e.g. when the
+# instance running its background task was shut down mid-run
+PROCESSING_TIMEOUT_MINUTES = int(os.getenv("PROCESSING_TIMEOUT_MINUTES", "60"))
 
 genai.configure(api_key=GEMINI_API_KEY)
 
+@lru_cache(maxsize=8)
+def get_gemini_model(model_name: str) -> genai.GenerativeModel:
+    """Return a cached Gemini model instance for the given model name."""
+    return genai.GenerativeModel(model_name)
 
+@lru_cache(maxsize=1024)
+def generate_answer(model_name: str, prompt: str) -> str:
+    """
+    Generate a Gemini answer for a prompt. Successful answers are cached, so an
+    identical question against the same retrieved context skips the API call.
+    """
+    response = get_gemini_model(model_name).generate_content(prompt)
+    return response.text.strip()
 
 def ask_gemini(question, context, gemini_model="models/gemini-2.5-flash"):
-    import google.api_core.exceptions
     prompt = (
         "You are a helpful assistant. Use the following context from a PDF to answer the user's question.\n\n"
         f"Context:\n{context}\n\n"
@@ -164,16 +197,12 @@ def ask_gemini(question, context, gemini_model="models/gemini-2.5-flash"):
         "Answer:"
     )
     try:
-        model = genai.GenerativeModel(gemini_model)
-        response = model.generate_content(prompt)
-        return response.text.strip()
+        return generate_answer(gemini_model, prompt)
     except google.api_core.exceptions.ResourceExhausted as e:
         # Quota error, try fallback model
         if gemini_model != "models/gemini-2.5-flash-lite":
             try:
-                model = genai.GenerativeModel("models/gemini-2.5-flash-lite")
-                response = model.generate_content(prompt)
-                return response.text.strip() + "\n\n(Note: Fallback to Flash-Lite due to quota limits.)"
+                return generate_answer("models/gemini-2.5-flash-lite", prompt) + "\n\n(Note: Fallback to Flash-Lite due to quota limits.)"
             except Exception as e2:
                 return f"Sorry, the AI service is currently rate-limited. Please try again later. (Both Flash and Flash-Lite quota exceeded.)"
         else:
@@ -181,33 +210,230 @@ def ask_gemini(question, context, gemini_model="models/gemini-2.5-flash"):
     except Exception as e:
         return f"Sorry, an error occurred with the AI service: {e}"
 
+def embed_texts(texts: list) -> np.ndarray:
+    """Encode all page texts in batches with the shared SentenceTransformer model."""
+    return model.encode(
+        texts,
+        batch_size=EMBEDDING_BATCH_SIZE,
+        convert_to_numpy=True,
+        normalize_embeddings=True,
+        show_progress_bar=False
+    ).astype(np.float32, copy=False)
+
+@lru_cache(maxsize=4096)
+def embed_question(normalized_question: str) -> tuple:
+    """Encode a normalized question; repeated questions reuse the cached embedding."""
+    return tuple(model.encode(normalized_question, normalize_embeddings=True).tolist())
+
+def upload_file_with_retry(bucket: str, storage_path: str, local_path: str, content_type: str, max_retries: int = 3) -> bool:
+    """
+    Upload a local file to a Supabase storage bucket, retrying with exponential backoff.
+    Returns True if the upload succeeded.
+    """
+    name = os.path.basename(local_path)
+    for attempt in range(max_retries):
+        try:
+            with open(local_path, "rb") as f:
+                logger.info(f"Starting upload for {name} (attempt {attempt + 1}/{max_retries})")
+                upload_res = supabase.storage.from_(bucket).upload(storage_path, f, file_options={"content-type": content_type})
+                if getattr(upload_res, "error", None):
+                    logger.error(f"Failed to upload {name}: {upload_res.error['message']}")
+                    if attempt < max_retries - 1:
+                        logger.info(f"Retrying upload for {name} (attempt {attempt + 2}/{max_retries})")
+                        continue
+                else:
+                    logger.info(f"Successfully uploaded {name}")
+                    return True
+        except Exception as e:
+            logger.error(f"Upload attempt {attempt + 1} failed for {name}: {e}")
+            if attempt < max_retries - 1:
+                logger.info(f"Retrying upload for {name} (attempt {attempt + 2}/{max_retries})")
+                time.sleep(2 ** attempt)  # Exponential backoff
+            else:
+                logger.error(f"Failed to upload {name} after {max_retries} attempts")
+    return False
+
+def upload_page_image(pdf_id: str, img_path: str):
+    """
+    Upload a page image to the 'pdfimg' bucket.
+    Runs in a worker thread; returns the storage path, or None if the upload failed.
+    """
+    img_storage_path = f"{pdf_id}/{os.path.basename(img_path)}"
+    content_type = "image/png" if img_path.endswith(".png") else "image/jpeg"
+    if upload_file_with_retry("pdfimg", img_storage_path, img_path, content_type):
+        return img_storage_path
+    return None
+
+def process_page(pdf_id: str, img_path: str, text: str, output_dir: str) -> dict:
+    """
+    Write a page's OCR text to disk and upload it to the 'pdftxt' bucket.
+    Runs in a worker thread; returns the uploaded storage path, page number and text.
+    """
+    img_name = os.path.basename(img_path)
+    txt_name = os.path.splitext(img_name)[0] + "_text.txt"
+    txt_local_path = os.path.join(output_dir, txt_name)
+    with open(txt_local_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    txt_storage_path = f"{pdf_id}/{txt_name}"
+    text_uploaded = upload_file_with_retry("pdftxt", txt_storage_path, txt_local_path, "text/plain")
+    os.remove(txt_local_path)
+
+    # Extract page number from txt_name (expects format 'page_XXX_text.txt')
+    try:
+        page_number = int(txt_name.split('_')[1])
+    except Exception:
+        page_number = None
+
+    return {
+        "text": txt_storage_path if text_uploaded else None,
+        "page_number": page_number,
+        "page_text": text
+    }
+
+async def process_uploaded_pdf(pdf_id: str, pdf_path: str):
+    """
+    Background pipeline for an uploaded PDF: convert pages to images, OCR them,
+    upload images and text to storage and store page embeddings.
+    The 'status' column of the pdfs row is set to 'completed' or 'failed' when done.
+    """
+    output_dir = f"images/{pdf_id}"
+    try:
+        # 1-3. Convert the local copy of the PDF to images page by page, uploading
+        # and OCR-ing pages while later ones are still rendering. The temp file is
+        # only removed once conversion is done, so the PDF never has to be downloaded back
+        loop = asyncio.get_running_loop()
+        uploaded_images, page_results = await loop.run_in_executor(None, process_pdf_pages, pdf_id, pdf_path, output_dir)
+        os.remove(pdf_path)
+
+        uploaded_texts = [r["text"] for r in page_results if r["text"]]
+
+        # Embed all pages in one batch and insert them in a single request
+        if page_results:
+            texts = [r["page_text"] for r in page_results]
+            embeddings = await loop.run_in_executor(None, embed_texts, texts)
+            rows = [
+                {
+                    "pdf_id": pdf_id,
+                    "page_number": r["page_number"],
+                    "text": r["page_text"],
+                    "embedding": embedding
+                }
+                for r, embedding in zip(page_results, embeddings)
+            ]
+            # Post straight to PostgREST so the float32 arrays are serialized by orjson
+            # instead of being converted to Python float lists first
+            resp = await http_client.post(
+                f"{SUPABASE_URL}/rest/v1/embeddings",
+                headers={**SUPABASE_REST_HEADERS, "Prefer": "return=minimal"},
+                content=orjson.dumps(rows, option=orjson.OPT_SERIALIZE_NUMPY)
+            )
+            resp.raise_for_status()
+
+        logger.info(f"Processed PDF {pdf_id}: {len(uploaded_images)} images and {len(uploaded_texts)} text files uploaded")
+        status = "completed"
+    except Exception as e:
+        logger.error(f"Processing failed for PDF {pdf_id}: {e}")
+        status = "failed"
+    finally:
+        # 4. Clean up local files
+        if os.path.exists(pdf_path):
+            os.remove(pdf_path)
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+    set_pdf_status(pdf_id, status)
+
+def set_pdf_status(pdf_id: str, status: str):
+    """Record the processing status of a PDF, logging instead of raising on failure."""
+    try:
+        supabase.table("pdfs").update({"status": status}).eq("id", pdf_id).execute()
+    except Exception as e:
+        logger.error(f"Failed to update status for PDF {pdf_id}: {e}")
+
+def extract_text_from_pdf_images(pdf_id: str, pdf_path: str, pages: list, output_dir: str) -> list:
+    """
+    Extract text from local page images of a PDF and upload text files to 'pdftxt' bucket.
+    Pages are (page_number, image_path) tuples rendered at the first-pass DPI; pages that
+    yield too little text are re-rendered from pdf_path at RERENDER_DPI and OCR'd again.
+    Returns the per-page results (uploaded text path, page number and text) in page order.
+    """
+    extractor = get_extractor()
+    image_paths = [img_path for _, img_path in pages]
+    page_texts = extractor.extract_text_batch(image_paths)
+
+    # Re-render sparse pages into a separate folder, so the first-pass images
+    # that may still be uploading are left untouched
+    rerender = [i for i, text in enumerate(page_texts) if needs_rerender(text)]
+    if rerender:
+        hires_dir = os.path.join(output_dir, "hires")
+        os.makedirs(hires_dir, exist_ok=True)
+        hires_paths = [render_page(pdf_path, pages[i][0] - 1, hires_dir, RERENDER_DPI) for i in rerender]
+        for i, text in zip(rerender, extractor.extract_text_batch(hires_paths)):
+            page_texts[i] = text
+        # The high-DPI copies are only needed for OCR
+        for path in hires_paths:
+            os.remove(path)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(PAGE_WORKERS, len(image_paths)))) as executor:
+        return list(executor.map(process_page, repeat(pdf_id), image_paths, page_texts, repeat(output_dir)))
+
+def process_pdf_pages(pdf_id: str, pdf_path: str, output_dir: str) -> tuple:
+    """
+    Render a PDF page by page and hand each page to the worker pool as soon as it is saved:
+    images are uploaded to 'pdfimg' one by one, and text is extracted and uploaded to 'pdftxt'
+    for every full Vision batch. Returns the uploaded image paths and the per-page text results.
+    """
+    image_futures = []
+    text_futures = []
+    batch = []
+    # Each page image is deleted as soon as both its upload and its OCR batch are done.
+    # Taking a slot before each new page stops rendering from getting more than
+    # MAX_PAGES_IN_FLIGHT pages ahead of the uploads and OCR.
+    page_slots = threading.BoundedSemaphore(MAX_PAGES_IN_FLIGHT)
+
+    def release_page(img_path):
+        try:
+            if os.path.exists(img_path):
+                os.remove(img_path)
+        finally:
+            page_slots.release()
+
+    def release_batch_when_uploaded(batch_pages, batch_image_futures):
+        # Called when the OCR batch is done; each page waits for its own upload as well
+        for (_, img_path), image_future in zip(batch_pages, batch_image_futures):
+            image_future.add_done_callback(lambda _, path=img_path: release_page(path))
+
+    def submit_batch(batch_pages):
+        batch_image_futures = image_futures[-len(batch_pages):]
+        future = executor.submit(extract_text_from_pdf_images, pdf_id, pdf_path, batch_pages, output_dir)
+        future.add_done_callback(lambda _: release_batch_when_uploaded(batch_pages, batch_image_futures))
+        text_futures.append(future)
+
+    with ThreadPoolExecutor(max_workers=PAGE_WORKERS) as executor:
+        for page_number, img_path in convert_pdf_to_images_iter(pdf_path, output_dir, dpi="auto"):
+            page_slots.acquire()
+            image_futures.append(executor.submit(upload_page_image, pdf_id, img_path))
+            batch.append((page_number, img_path))
+            if len(batch) == MAX_BATCH_SIZE:
+                submit_batch(batch)
+                batch = []
+        if batch:
+            submit_batch(batch)
+
+        uploaded_images = [path for path in (f.result() for f in image_futures) if path]
+        page_results = [result for f in text_futures for result in f.result()]
+    return uploaded_images, page_results
+
 @app.post("/upload_pdf/")
-async def upload_pdf(file: UploadFile = File(...)):
+async def upload_pdf(background_tasks: BackgroundTasks, file: UploadFile = File(...)):
     if not file.filename.lower().endswith(".pdf"):
         raise HTTPException(status_code=400, detail="Only PDF files are allowed.")
 
-    # Save the uploaded file to a temporary location
+    # Stream the uploaded file to a temporary location in 1MB chunks
     temp_filename = f"temp_{uuid.uuid4()}.pdf"
     with open(temp_filename, "wb") as f:
-        content = await file.read()
-        f.write(content)
+        await run_in_threadpool(shutil.copyfileobj, file.file, f, UPLOAD_CHUNK_SIZE)
 
-    # Insert PDF metadata into Supabase (without storage_path for now)
-    try:
-        pdf_name = file.filename
-        upload_date = datetime.utcnow().isoformat()
-        data = supabase.table("pdfs").insert({"name": pdf_name, "upload_date": upload_date}).execute()
-        pdf_id = data.data[0]["id"]
-    except Exception as e:
-        print("Exception occurred:", e)
-        os.remove(temp_filename)
-        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
-
-    # Upload the PDF to Supabase Storage
-    bucket_name = "pdfs"
-    storage_path = f"{pdf_id}/{file.filename}"
-    
-    # Check file size before upload (Supabase free tier limit is 50MB)
+    # Check file size before creating the record (Supabase free tier limit is 50MB)
     file_size = os.path.getsize(temp_filename)
     file_size_mb = file_size / (1024 * 1024)
     supabase_free_tier_limit_mb = 50
@@ -225,14 +451,37 @@ async def upload_pdf(file: UploadFile = File(...)):
             }
         )
     
+    # Insert PDF metadata into Supabase. The id is generated here so the storage
+    # path is known up front and written in the same request.
+    bucket_name = "pdfs"
+    pdf_id = str(uuid.uuid4())
+    storage_path = f"{pdf_id}/{file.filename}"
+    try:
+        pdf_name = file.filename
+        upload_date = datetime.utcnow().isoformat()
+        supabase.table("pdfs").insert({
+            "id": pdf_id,
+            "name": pdf_name,
+            "upload_date": upload_date,
+            "storage_path": storage_path,
+            "status": "processing",
+            "processing_started_at": datetime.now(timezone.utc).isoformat()
+        }).execute()
+    except Exception as e:
+        print("Exception occurred:", e)
+        os.remove(temp_filename)
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+    # Upload the PDF to Supabase Storage; on failure the record is marked as
+    # failed so status polling does not report it as processing forever
     try:
         with open(temp_filename, "rb") as f:
             res = supabase.storage.from_(bucket_name).upload(storage_path, f, file_options={"content-type": "application/pdf"})
         if getattr(res, "error", None):
-            os.remove(temp_filename)
             raise HTTPException(status_code=500, detail=f"Storage error: {res.error['message']}")
     except StorageApiError as e:
         os.remove(temp_filename)
+        set_pdf_status(pdf_id, "failed")
         if "413" in str(e) or "payload too large" in str(e).lower() or "exceeded the maximum allowed size" in str(e).lower():
             raise HTTPException(
                 status_code=413, 
@@ -248,151 +497,53 @@ async def upload_pdf(file: UploadFile = File(...)):
             raise HTTPException(status_code=500, detail=f"Storage error: {str(e)}")
     except Exception as e:
         os.remove(temp_filename)
+        set_pdf_status(pdf_id, "failed")
         logger.error(f"PDF upload failed for {file.filename}: {str(e)}")
         raise HTTPException(status_code=500, detail=f"PDF upload failed: {str(e)}")
 
-    # Update the pdfs table with the storage path
-    try:
-        supabase.table("pdfs").update({"storage_path": storage_path}).eq("id", pdf_id).execute()
-    except Exception as e:
-        os.remove(temp_filename)
-        raise HTTPException(status_code=500, detail=f"Failed to update storage path: {str(e)}")
+    # Convert, OCR and embed the PDF after the response has been sent
+    background_tasks.add_task(process_uploaded_pdf, pdf_id, temp_filename)
 
-    # Clean up temp file
-    os.remove(temp_filename)
+    return JSONResponse(status_code=202, content={
+        "message": "PDF uploaded, processing started.",
+        "pdf_id": pdf_id,
+        "pdf_name": pdf_name,
+        "upload_date": upload_date,
+        "storage_path": storage_path,
+        "status": "processing",
+        "status_url": f"/pdfs/{pdf_id}/status"
+    })
 
-    # --- Download PDF from bucket, convert to images locally ---
-    downloaded_pdf_path = f"{pdf_id}_{file.filename}"
-    
-    # Verify the PDF was uploaded successfully before proceeding
+@app.get("/pdfs/{pdf_id}/status")
+async def get_pdf_status(pdf_id: str):
     try:
-        download_res = supabase.storage.from_(bucket_name).download(storage_path)
-        with open(downloaded_pdf_path, "wb") as f:
-            f.write(download_res)
-        logger.info(f"Successfully downloaded PDF for processing: {file.filename}")
+        data = supabase.table("pdfs").select("id, name, status").eq("id", pdf_id).execute()
     except Exception as e:
-        logger.error(f"Failed to download PDF from storage: {str(e)}")
-        # Clean up the database entry since storage upload failed
-        try:
-            supabase.table("pdfs").delete().eq("id", pdf_id).execute()
-        except Exception as cleanup_error:
-            logger.error(f"Failed to cleanup database entry: {cleanup_error}")
-        
-        raise HTTPException(
-            status_code=500, 
-            detail={
-                "error": "PDF upload verification failed",
-                "message": f"PDF was not uploaded successfully to storage. Error: {str(e)}",
-                "file": file.filename
-            }
-        )
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    if not data.data:
+        raise HTTPException(status_code=404, detail="PDF not found.")
+    pdf = data.data[0]
 
-    # 1. Convert PDF to images locally
-    output_dir = f"images/{pdf_id}"
-    os.makedirs(output_dir, exist_ok=True)
-    image_paths = convert_pdf_to_images(downloaded_pdf_path, output_dir)
-
-    # 2. Upload images to the 'pdfimg' bucket
-    img_bucket = "pdfimg"
-    uploaded_images = []
-    for img_path in image_paths:
-        img_name = os.path.basename(img_path)
-        img_storage_path = f"{pdf_id}/{img_name}"
-        
-        # Retry logic for upload with better error handling
-        max_retries = 3
-        for attempt in range(max_retries):
-            try:
-                with open(img_path, "rb") as img_file:
-                    logger.info(f"Starting upload for {img_name} (attempt {attempt + 1}/{max_retries})")
-                    upload_res = supabase.storage.from_(img_bucket).upload(img_storage_path, img_file, file_options={"content-type": "image/jpeg"})
-                    
-                    if getattr(upload_res, "error", None):
-                        logger.error(f"Failed to upload image {img_name}: {upload_res.error['message']}")
-                        if attempt < max_retries - 1:
-                            logger.info(f"Retrying upload for {img_name} (attempt {attempt + 2}/{max_retries})")
-                            continue
-                    else:
-                        uploaded_images.append(img_storage_path)
-                        logger.info(f"Successfully uploaded {img_name}")
-                        break
-                        
-            except Exception as e:
-                logger.error(f"Upload attempt {attempt + 1} failed for {img_name}: {e}")
-                if attempt < max_retries - 1:
-                    logger.info(f"Retrying upload for {img_name} (attempt {attempt + 2}/{max_retries})")
-                    import time
-                    time.sleep(2 ** attempt)  # Exponential backoff
-                else:
-                    logger.error(f"Failed to upload {img_name} after {max_retries} attempts")
-
-    # 3. Extract text from local images and upload to 'pdftxt' bucket
-    extractor = ImageTextExtractor(VISION_CREDENTIALS_FILE)
-    uploaded_texts = []
-    for img_path in image_paths:
-        text = extractor.extract_text_from_image(img_path)
-        txt_name = os.path.splitext(os.path.basename(img_path))[0] + "_text.txt"
-        txt_local_path = os.path.join(output_dir, txt_name)
-        with open(txt_local_path, "w", encoding="utf-8") as f:
-            f.write(text)
-        txt_storage_path = f"{pdf_id}/{txt_name}"
-        
-        # Retry logic for text file upload
-        max_retries = 3
-        for attempt in range(max_retries):
-            try:
-                with open(txt_local_path, "rb") as f_txt:
-                    logger.info(f"Starting text upload for {txt_name} (attempt {attempt + 1}/{max_retries})")
-                    upload_res = supabase.storage.from_("pdftxt").upload(txt_storage_path, f_txt, file_options={"content-type": "text/plain"})
-                    if getattr(upload_res, "error", None):
-                        logger.error(f"Failed to upload text file {txt_name}: {upload_res.error['message']}")
-                        if attempt < max_retries - 1:
-                            logger.info(f"Retrying text upload for {txt_name} (attempt {attempt + 2}/{max_retries})")
-                            continue
-                    else:
-                        uploaded_texts.append(txt_storage_path)
-                        logger.info(f"Successfully uploaded text file {txt_name}")
-                        break
-            except Exception as e:
-                logger.error(f"Text upload attempt {attempt + 1} failed for {txt_name}: {e}")
-                if attempt < max_retries - 1:
-                    logger.info(f"Retrying text upload for {txt_name} (attempt {attempt + 2}/{max_retries})")
-                    import time
-                    time.sleep(2 ** attempt)  # Exponential backoff
-                else:
-                    logger.error(f"Failed to upload text file {txt_name} after {max_retries} attempts")
-        # --- Generate and store embedding ---
-        # Extract page number from txt_name (expects format 'page_XXX_text.txt')
-        try:
-            page_number = int(txt_name.split('_')[1])
-        except Exception:
-            page_number = None
-        embedding = model.encode(text).tolist()
-        # Insert into Supabase embeddings table
+    # Background tasks die with their instance, so a row stuck in 'processing'
+    # past the timeout is marked failed. The age is compared in the database.
+    if pdf["status"] == "processing":
+        cutoff = (datetime.now(timezone.utc) - timedelta(minutes=PROCESSING_TIMEOUT_MINUTES)).isoformat()
         try:
-            supabase.table("embeddings").insert({
-                "pdf_id": pdf_id,
-                "page_number": page_number,
-                "text": text,
-                "embedding": embedding
-            }).execute()
+            stale = (
+                supabase.table("pdfs").update({"status": "failed"})
+                .eq("id", pdf_id).eq("status", "processing").lt("processing_started_at", cutoff)
+                .execute()
+            )
+            if stale.data:
+                pdf["status"] = "failed"
         except Exception as e:
-            logger.error(f"Failed to insert embedding for {txt_name}: {e}")
-
-    # 4. Clean up local files
-    import shutil
-    shutil.rmtree(output_dir)
-    os.remove(downloaded_pdf_path)
+            logger.error(f"Failed to check for stale processing of PDF {pdf_id}: {e}")
 
-    return JSONResponse({
-        "message": "PDF uploaded, images extracted and uploaded, text extracted and uploaded.",
-        "pdf_id": pdf_id,
-        "pdf_name": pdf_name,
-        "upload_date": upload_date,
-        "storage_path": storage_path,
-        "uploaded_images": uploaded_images,
-        "uploaded_texts": uploaded_texts
-    })
+    return {
+        "pdf_id": pdf["id"],
+        "pdf_name": pdf["name"],
+        "status": pdf["status"]
+    }
 
 @app.post("/ask/")
 async def ask_question(
@@ -401,23 +552,16 @@ async def ask_question(
     match_count: int = Body(3),
     gemini_model: str = Body("models/gemini-2.5-flash")
 ):
-    # 1. Generate embedding for the question
-    question_embedding = model.encode(question).tolist()
+    # 1. Generate embedding for the question (the model is uncased, so lowercasing is safe)
+    question_embedding = list(await run_in_threadpool(embed_question, question.strip().lower()))
     # 2. Call Supabase REST API to run match_embeddings
-    SUPABASE_URL = os.getenv("SUPABASE_URL")
-    SUPABASE_KEY = os.getenv("SUPABASE_KEY")
     url = f"{SUPABASE_URL}/rest/v1/rpc/match_embeddings"
-    headers = {
-        "apikey": SUPABASE_KEY,
-        "Authorization": f"Bearer {SUPABASE_KEY}",
-        "Content-Type": "application/json"
-    }
     data = {
         "query_embedding": question_embedding,
         "match_pdf_id": pdf_id,
         "match_count": match_count
     }
-    resp = requests.post(url, headers=headers, json=data, timeout=60)  # 60 second timeout
+    resp = await http_client.post(url, headers=SUPABASE_REST_HEADERS, json=data)
     resp.raise_for_status()
     results = resp.json()
     # 3. Return the best match(es)
@@ -431,7 +575,7 @@ async def ask_question(
         })
     # 4. RAG: Use Gemini to generate a final answer
     context = "\n\n".join([a["answer"] for a in answers])
-    rag_answer = ask_gemini(question, context, gemini_model=gemini_model)
+    rag_answer = await run_in_threadpool(ask_gemini, question, context, gemini_model=gemini_model)
     return {
         "rag_answer": rag_answer,
         "matches": answers
@@ -1,64 +1,254 @@
 import os
+import multiprocessing
+import threading
+from collections import deque
 import fitz  # PyMuPDF
 from PIL import Image
 from pathlib import Path
 
-def convert_pdf_to_images(pdf_path, output_folder=None, dpi=300):
+# Upper bound on rendering processes; rasterizing is CPU-bound but each worker holds a full-page pixmap
+MAX_RENDER_WORKERS = 4
+
+# Pages each worker may render ahead of the consumer; bounds the images on disk
+# when the caller processes pages more slowly than they are rendered
+RENDER_AHEAD_PER_WORKER = 2
+
+# Render pools allowed at once across concurrent conversions (e.g. simultaneous uploads);
+# further conversions wait for a pool to finish instead of multiplying worker processes
+MAX_CONCURRENT_RENDER_POOLS = 2
+_render_pool_slots = threading.BoundedSemaphore(MAX_CONCURRENT_RENDER_POOLS)
+
+# Start render workers from a clean server process rather than forking the caller,
+# which may be a multi-threaded web server; fork there can deadlock the children
+_render_context = multiprocessing.get_context(
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+
+# PyMuPDF must not be called from several threads at once. Every in-process fitz call
+# (render_page, page counting, the single-process render loop) holds this lock;
+# pool workers are separate processes and do not need it.
+_fitz_lock = threading.Lock()
+
+# JPEG settings for rendered pages, encoded by Pillow straight from the pixmap buffer.
+# Baseline (non-progressive, non-optimized) encoding is several times cheaper than the
+# progressive JPEG MuPDF's own encoder writes; 4:4:4 chroma keeps glyph edges sharp for OCR.
+JPEG_QUALITY = 85
+JPEG_SAVE_OPTIONS = {"quality": JPEG_QUALITY, "subsampling": 0, "optimize": False, "progressive": False}
+
+# File extension for each supported output format
+IMAGE_EXTENSIONS = {"jpeg": "jpg", "png": "png"}
+
+# Two-stage rendering: dpi="auto" renders every page at FIRST_PASS_DPI, which is enough for
+# most text pages; callers re-render pages whose OCR comes back sparse at RERENDER_DPI
+FIRST_PASS_DPI = 150
+RERENDER_DPI = 300
+
+def get_output_folder(pdf_path, output_folder=None):
     """
-    Convert each page of a PDF to an image using PyMuPDF.
+    Resolve the folder that page images are written to.
     
     Args:
     pdf_path (str): Path to the input PDF file
     output_folder (str, optional): Path to the output folder for images. 
                                    If not provided, creates a folder next to the PDF.
-    dpi (int, optional): Resolution of the output images. Default is 300.
     
     Returns:
-    list: Paths to the generated image files
+    str: Path to the output folder
     """
-    # Validate PDF path
-    if not os.path.exists(pdf_path):
-        raise FileNotFoundError(f"The PDF file {pdf_path} does not exist.")
-    
     # Determine output folder
     if output_folder is None:
         # Create a folder with the same name as the PDF in the same directory
         pdf_name = Path(pdf_path).stem
         output_folder = os.path.join(os.path.dirname(pdf_path), f"{pdf_name}_images")
     
+    return output_folder
+
+def save_page_image(pdf_document, page_num, matrix, output_folder, fmt="jpeg"):
+    """
+    Render one page of an already open PDF with a prebuilt scaling matrix and save it.
+    
+    Args:
+    pdf_document (fitz.Document): Open PDF document
+    page_num (int): Zero-based index of the page to render
+    matrix (fitz.Matrix): Scaling matrix for the target resolution (1.0 = 72 dpi)
+    output_folder (str): Path to the output folder for the image
+    fmt (str, optional): Image format, "jpeg" or "png". Default is "jpeg".
+    
+    Returns:
+    str: Path to the generated image file
+    """
+    # Get the page
+    page = pdf_document[page_num]
+    
+    # Render page to an image
+    # RGB without alpha keeps the buffer at 3 bytes per pixel, since neither
+    # JPEG nor OCR use transparency
+    pix = page.get_pixmap(matrix=matrix, alpha=False, colorspace=fitz.csRGB)
+    
+    # Generate filename (page_001.jpg, page_002.jpg, etc.)
+    filename = os.path.join(output_folder, f"page_{page_num+1:03d}.{IMAGE_EXTENSIONS[fmt]}")
+    
+    # Save the image: PNG with MuPDF's own encoder, JPEG with Pillow reading the
+    # pixmap samples in place (no copy) and writing baseline JPEG
+    if fmt == "png":
+        pix.save(filename)
+    else:
+        image = Image.frombuffer("RGB", (pix.width, pix.height), pix.samples_mv, "raw", "RGB", pix.stride, 1)
+        image.save(filename, "JPEG", **JPEG_SAVE_OPTIONS)
+    
+    # Release the pixmap buffer before the next page is rendered
+    pix = None
+    return filename
+
+def render_page(pdf_path, page_num, output_folder, dpi=300, fmt="jpeg"):
+    """
+    Render a single PDF page to an image.
+    Opens the PDF itself, so it suits one-off renders such as a high-DPI retry.
+    Safe to call from several threads; calls are serialized on _fitz_lock.
+    
+    Args:
+    pdf_path (str): Path to the input PDF file
+    page_num (int): Zero-based index of the page to render
+    output_folder (str): Path to the output folder for the image
+    dpi (int, optional): Resolution of the output image. Default is 300.
+    fmt (str, optional): Image format, "jpeg" or "png". Default is "jpeg".
+                         PNG is often smaller and faster to encode for pure text pages;
+                         JPEG is better for pages with photos.
+    
+    Returns:
+    str: Path to the generated image file
+    """
+    with _fitz_lock, fitz.open(pdf_path) as pdf_document:
+        return save_page_image(pdf_document, page_num, fitz.Matrix(dpi/72, dpi/72), output_folder, fmt)
+
+# Per-process rendering state, set up once by _init_render_worker
+_worker_document = None
+_worker_matrix = None
+
+def _init_render_worker(pdf_path, dpi):
+    """Process pool initializer: open the PDF and build the scaling matrix once per worker."""
+    global _worker_document, _worker_matrix
+    _worker_document = fitz.open(pdf_path)
+    _worker_matrix = fitz.Matrix(dpi/72, dpi/72)
+
+def _render_page_task(args):
+    """Process pool entry point: unpack a (page_num, output_folder, fmt) task."""
+    page_num, output_folder, fmt = args
+    return save_page_image(_worker_document, page_num, _worker_matrix, output_folder, fmt)
+
+def convert_pdf_to_images_iter(pdf_path, output_folder=None, dpi=300, workers=None, fmt="jpeg"):
+    """
+    Convert a PDF to images, yielding each image in page order as soon as it is saved.
+    Lets callers start working on early pages while later pages are still being rendered.
+    Pages are rendered in parallel by a pool of worker processes; each worker holds at
+    most one page pixmap at a time, so peak memory does not grow with the page count.
+    
+    Args:
+    pdf_path (str): Path to the input PDF file
+    output_folder (str, optional): Path to the output folder for images. 
+                                   If not provided, creates a folder next to the PDF.
+    dpi (int or str, optional): Resolution of the output images. Default is 300.
+                                "auto" renders at FIRST_PASS_DPI (see render_page to re-render a page).
+    workers (int, optional): Number of rendering processes. 
+                             Defaults to the CPU count, capped at MAX_RENDER_WORKERS.
+    fmt (str, optional): Image format, "jpeg" or "png". Default is "jpeg".
+    
+    Yields:
+    tuple: (page_number, image_path) for each page, page numbers starting at 1
+    """
+    # Validate arguments before touching the PDF or creating the output folder
+    if fmt not in IMAGE_EXTENSIONS:
+        raise ValueError(f"Unsupported image format '{fmt}'. Use one of: {', '.join(IMAGE_EXTENSIONS)}")
+    if dpi == "auto":
+        dpi = FIRST_PASS_DPI
+    elif isinstance(dpi, bool) or not isinstance(dpi, (int, float)) or dpi <= 0:
+        raise ValueError(f"Invalid dpi {dpi!r}. Use a positive number or \"auto\".")
+    
+    # Validate PDF path; fitz.open raises its own RuntimeError subclass for a missing
+    # file, which callers would not recognise as the built-in FileNotFoundError
+    if not os.path.exists(pdf_path):
+        raise FileNotFoundError(f"The PDF file {pdf_path} does not exist.")
+    
+    # Count pages, closing the PDF again before any worker process is started
+    with _fitz_lock, fitz.open(pdf_path) as pdf_document:
+        page_count = len(pdf_document)
+    
     # Create output folder if it doesn't exist
+    output_folder = get_output_folder(pdf_path, output_folder)
     os.makedirs(output_folder, exist_ok=True)
     
+    if workers is None:
+        workers = min(os.cpu_count() or 1, MAX_RENDER_WORKERS)
+    
+    # Render in-process when there is nothing to parallelize, reusing one open
+    # document and one scaling matrix for every page. The lock is held per page,
+    # never across a yield, so other threads can render between pages.
+    if workers <= 1 or page_count <= 1:
+        matrix = fitz.Matrix(dpi/72, dpi/72)
+        with _fitz_lock:
+            pdf_document = fitz.open(pdf_path)
+        try:
+            for page_num in range(page_count):
+                with _fitz_lock:
+                    filename = save_page_image(pdf_document, page_num, matrix, output_folder, fmt)
+                yield page_num + 1, filename
+        finally:
+            with _fitz_lock:
+                pdf_document.close()
+        return
+    
+    # Each worker opens the PDF and builds the matrix once, not once per page.
+    # Pages are submitted in a sliding window rather than all at once, so rendering
+    # only runs a bounded number of pages ahead of what the caller has consumed.
+    pool_size = min(workers, page_count)
+    tasks = iter([(page_num, output_folder, fmt) for page_num in range(page_count)])
+    with _render_pool_slots, _render_context.Pool(pool_size, initializer=_init_render_worker,
+                                                  initargs=(pdf_path, dpi)) as pool:
+        pending = deque()
+        for task in tasks:
+            pending.append(pool.apply_async(_render_page_task, (task,)))
+            if len(pending) == pool_size * RENDER_AHEAD_PER_WORKER:
+                break
+        page_number = 0
+        while pending:
+            filename = pending.popleft().get()
+            task = next(tasks, None)
+            if task is not None:
+                pending.append(pool.apply_async(_render_page_task, (task,)))
+            page_number += 1
+            yield page_number, filename
+
+def convert_pdf_to_images(pdf_path, output_folder=None, dpi=300, workers=None, fmt="jpeg"):
+    """
+    Convert each page of a PDF to an image using PyMuPDF.
+    Collects every path before returning; callers that only need the pages in
+    order should use convert_pdf_to_images_iter instead.
+    
+    Args:
+    pdf_path (str): Path to the input PDF file
+    output_folder (str, optional): Path to the output folder for images. 
+                                   If not provided, creates a folder next to the PDF.
+    dpi (int or str, optional): Resolution of the output images. Default is 300.
+                                "auto" renders at FIRST_PASS_DPI.
+    workers (int, optional): Number of rendering processes. 
+                             Defaults to the CPU count, capped at MAX_RENDER_WORKERS.
+    fmt (str, optional): Image format, "jpeg" or "png". Default is "jpeg".
+    
+    Returns:
+    list: Paths to the generated image files
+    """
+    output_folder = get_output_folder(pdf_path, output_folder)
+    
     # Convert PDF to images
     try:
-        # Open the PDF
-        pdf_document = fitz.open(pdf_path)
-        
-        # Store image paths
-        image_paths = []
-        
-        # Iterate through pages
-        for page_num in range(len(pdf_document)):
-            # Get the page
-            page = pdf_document[page_num]
-            
-            # Render page to an image
-            # The matrix argument scales the image (1.0 = 72 dpi)
-            pix = page.get_pixmap(matrix=fitz.Matrix(dpi/72, dpi/72))
-            
-            # Generate filename (page_001.jpg, page_002.jpg, etc.)
-            filename = os.path.join(output_folder, f"page_{page_num+1:03d}.jpg")
-            
-            # Save the image
-            Image.frombytes("RGB", (pix.width, pix.height), pix.samples).save(filename, "JPEG")
-            image_paths.append(filename)
-        
-        # Close the PDF document
-        pdf_document.close()
+        image_paths = [image_path for _, image_path in convert_pdf_to_images_iter(pdf_path, output_folder, dpi, workers, fmt)]
         
         print(f"Successfully converted {len(image_paths)} pages to images in {output_folder}")
         return image_paths
     
+    except (FileNotFoundError, ValueError):
+        # A missing PDF or invalid arguments are reported to the caller, not swallowed
+        raise
     except Exception as e:
         print(f"An error occurred during PDF conversion: {e}")
         return []
@@ -87,14 +277,13 @@ def main():
     except ValueError:
         dpi = 300
     
-    # Convert PDF to images
-    converted_images = convert_pdf_to_images(pdf_path, output_folder, dpi)
-    
-    # Print paths of converted images
-    if converted_images:
-        print("\nConverted Image Paths:")
-        for img_path in converted_images:
+    # Convert PDF to images, printing each path as soon as the page is saved
+    print("\nConverted Image Paths:")
+    try:
+        for _, img_path in convert_pdf_to_images_iter(pdf_path, output_folder, dpi):
             print(img_path)
+    except Exception as e:
+        print(f"An error occurred during PDF conversion: {e}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
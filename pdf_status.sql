@@ -0,0 +1,8 @@
+-- Track background processing of uploaded PDFs.
+-- Rows that already exist were processed synchronously, so they are backfilled
+-- as completed; upload_pdf always writes the status of new rows explicitly.
+alter table pdfs add column if not exists status text not null default 'completed';
+
+-- When processing started; the status endpoint reports rows still 'processing'
+-- after PROCESSING_TIMEOUT_MINUTES as failed
+alter table pdfs add column if not exists processing_started_at timestamptz;
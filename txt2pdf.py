@@ -5,9 +5,11 @@ Requires: pip install reportlab
 """
 
 import os
-import glob
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from reportlab.lib.pagesizes import letter, A4
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, PageBreak
+from reportlab.platypus import SimpleDocTemplate, Spacer, PageBreak
+from reportlab.platypus.paragraph import Paragraph
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
 from reportlab.lib import colors
@@ -15,6 +17,101 @@ from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 import re
 import unicodedata
+from collections import deque
+from itertools import islice
+
+# Threads used to read input files ahead of processing; at most this many
+# files are read ahead of the one being processed
+READ_WORKERS = 4
+
+class ControlCharTable(dict):
+    """
+    str.translate() table that deletes characters in the Unicode "Other" (C*)
+    categories and keeps everything else. Categories are looked up once per
+    code point and cached, so filtering runs in C instead of a per-character loop.
+    """
+    def __missing__(self, codepoint):
+        value = None if unicodedata.category(chr(codepoint)).startswith('C') else codepoint
+        self[codepoint] = value
+        return value
+
+_DELETE_TABLE = ControlCharTable()
+
+_WS_RE = re.compile(r'\s+')
+
+# Only remove specific problematic characters that actually cause black boxes,
+# NOT diacritical marks which are legitimate: private use area, control characters,
+# the replacement character (black diamond with ?) and runs of ■ rendering errors
+_STRIP_RE = re.compile(r'[\uf000-\uf8ff\u0000-\u001f\u007f-\u009f\ufffd■]+')
+
+# Standard safe replacements (not diacritics)
+_REPL_TABLE = str.maketrans({
+    '\ufeff': '',   # BOM
+    '\u00a0': ' ',  # Non-breaking space
+    '\u2013': '-',  # En dash
+    '\u2014': '--', # Em dash
+    '\u2018': "'",  # Left single quote
+    '\u2019': "'",  # Right single quote
+    '\u201c': '"',  # Left double quote
+    '\u201d': '"',  # Right double quote
+    '\u2026': '...' # Ellipsis
+})
+
+# XML/HTML escapes for reportlab markup, plus line breaks as HTML breaks
+_XML_LINEBREAK = str.maketrans({'&': '&amp;', '<': '&lt;', '>': '&gt;', '\n': '<br/>'})
+
+@lru_cache(maxsize=1)
+def get_paragraph_styles():
+    """
+    Build the title and content paragraph styles once and reuse them for every conversion.
+    
+    Returns:
+        tuple: (title_style, content_style)
+    """
+    # Get styles
+    styles = getSampleStyleSheet()
+    
+    # Create custom styles with Unicode-friendly font
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=16,
+        spaceAfter=30,
+        textColor=colors.darkblue,
+        alignment=1,  # Center alignment
+        fontName='Helvetica'  # Ensure we use a font that supports more characters
+    )
+    
+    content_style = ParagraphStyle(
+        'CustomContent',
+        parent=styles['Normal'],
+        fontSize=11,
+        spaceAfter=12,
+        leftIndent=0,
+        rightIndent=0,
+        fontName='Helvetica'
+    )
+    
+    return title_style, content_style
+
+def read_text_file(txt_file):
+    """
+    Read a text file from disk once and decode it.
+    
+    Args:
+        txt_file (str): Path to the .txt file
+    
+    Returns:
+        str: File content decoded as UTF-8 (BOM removed), or as Latin-1 if it is not valid UTF-8
+    """
+    with open(txt_file, 'rb', buffering=1024 * 1024) as f:
+        raw_content = f.read()
+    
+    try:
+        return raw_content.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        # Latin-1 maps every byte, so this never fails
+        return raw_content.decode('latin-1')
 
 def txt_to_pdf(input_folder, output_pdf="combined_texts.pdf", page_size=A4):
     """
@@ -31,16 +128,18 @@ def txt_to_pdf(input_folder, output_pdf="combined_texts.pdf", page_size=A4):
         print(f"Error: Folder '{input_folder}' does not exist.")
         return False
     
-    # Get all .txt files in the folder
-    txt_files = glob.glob(os.path.join(input_folder, "*.txt"))
+    # Get all .txt files in the folder (skipping hidden files, like glob does),
+    # sorted alphabetically, in a single directory scan
+    with os.scandir(input_folder) as entries:
+        txt_files = sorted(
+            entry.path for entry in entries
+            if entry.name.endswith('.txt') and not entry.name.startswith('.') and entry.is_file()
+        )
     
     if not txt_files:
         print(f"No .txt files found in '{input_folder}'")
         return False
     
-    # Sort files alphabetically
-    txt_files.sort()
-    
     print(f"Found {len(txt_files)} .txt files")
     
     # Create PDF document
@@ -49,144 +148,68 @@ def txt_to_pdf(input_folder, output_pdf="combined_texts.pdf", page_size=A4):
                           topMargin=72, bottomMargin=18)
     
     # Get styles
-    styles = getSampleStyleSheet()
-    
-    # Create custom styles with Unicode-friendly font
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=16,
-        spaceAfter=30,
-        textColor=colors.darkblue,
-        alignment=1,  # Center alignment
-        fontName='Helvetica'  # Ensure we use a font that supports more characters
-    )
-    
-    content_style = ParagraphStyle(
-        'CustomContent',
-        parent=styles['Normal'],
-        fontSize=11,
-        spaceAfter=12,
-        leftIndent=0,
-        rightIndent=0,
-        fontName='Helvetica'
-    )
+    title_style, content_style = get_paragraph_styles()
     
     # Build story (content) for PDF
     story = []
+    add_to_story = story.append  # bound once, used for every paragraph
     
-    for i, txt_file in enumerate(txt_files):
-        try:
-            # Read the text file with better encoding handling
-            content = None
-            encodings_to_try = ['utf-8', 'utf-8-sig', 'latin-1', 'cp1252', 'iso-8859-1']
-            
-            for encoding in encodings_to_try:
-                try:
-                    with open(txt_file, 'r', encoding=encoding) as f:
-                        content = f.read()
-                    break
-                except UnicodeDecodeError:
-                    continue
-            
-            if content is None:
-                # Last resort: read as binary and decode with error handling
-                with open(txt_file, 'rb') as f:
-                    raw_content = f.read()
-                content = raw_content.decode('utf-8', errors='replace')
-            
-            # Get filename without path and extension for title
-            filename = os.path.splitext(os.path.basename(txt_file))[0]
-            
-            print(f"Processing: {filename}")
-            
-            # Add filename as title
-            story.append(Paragraph(f"File: {filename}", title_style))
-            story.append(Spacer(1, 12))
-            
-            # Split content into paragraphs and add to story
-            paragraphs = content.split('\n\n')
-            for paragraph in paragraphs:
-                if paragraph.strip():  # Skip empty paragraphs
-                    # Clean and normalize the text
-                    clean_paragraph = paragraph.strip()
-                    
-                    # Only remove specific problematic characters that actually cause black boxes
-                    # NOT diacritical marks which are legitimate
-                    
-                    # Remove only actual problematic characters (private use area, control chars)
-                    problematic_chars = [
-                        '\uf020', '\uf021', '\uf022', '\uf023', '\uf024', '\uf025',  # Private use area
-                        '\ufffd',  # Replacement character (actual black diamond with ?)
-                    ]
-                    
-                    for char in problematic_chars:
-                        clean_paragraph = clean_paragraph.replace(char, '')
-                    
-                    # Remove only private use area characters, NOT legitimate diacritics
-                    clean_paragraph = re.sub(r'[\uf000-\uf8ff]', '', clean_paragraph)  # Private use area only
-                    clean_paragraph = re.sub(r'[\u0000-\u001f\u007f-\u009f]', '', clean_paragraph)  # Control characters only
-                    
-                    # Handle only actual rendering issues, not diacritics
-                    # If the original text had actual ■ symbols, replace them carefully
-                    if '■' in clean_paragraph:
-                        # Only replace if it's clearly a rendering error pattern
-                        clean_paragraph = re.sub(r'■+', '', clean_paragraph)
-                    
-                    # Standard safe replacements (not diacritics)
-                    replacements = {
-                        '\ufeff': '',   # BOM
-                        '\u00a0': ' ',  # Non-breaking space
-                        '\u2013': '-',  # En dash
-                        '\u2014': '--', # Em dash
-                        '\u2018': "'",  # Left single quote
-                        '\u2019': "'",  # Right single quote
-                        '\u201c': '"',  # Left double quote
-                        '\u201d': '"',  # Right double quote
-                        '\u2026': '...' # Ellipsis
-                    }
-                    
-                    for old, new in replacements.items():
-                        clean_paragraph = clean_paragraph.replace(old, new)
-                    
-                    # Escape XML/HTML special characters for reportlab
-                    clean_paragraph = clean_paragraph.replace('&', '&amp;')
-                    clean_paragraph = clean_paragraph.replace('<', '&lt;')
-                    clean_paragraph = clean_paragraph.replace('>', '&gt;')
-                    
-                    # Convert line breaks to HTML breaks
-                    clean_paragraph = clean_paragraph.replace('\n', '<br/>')
-                    
-                    # Much more conservative character filtering
-                    # Keep all legitimate Unicode characters including diacritics
-                    safe_chars = []
-                    for char in clean_paragraph:
-                        # Keep most Unicode characters, only filter out truly problematic ones
-                        if ord(char) < 32 and char not in ['\t']:
-                            continue  # Skip control characters except tab
-                        elif char in ['<', '>', '&', ';', '/', ' ', 'b', 'r']:  # HTML entities and markup
-                            safe_chars.append(char)
-                        elif ord(char) >= 32:  # Keep most printable characters including Unicode
-                            # Check if it's a legitimate character (not a control or private use)
-                            category = unicodedata.category(char)
-                            if not category.startswith('C'):  # Not a control character
-                                safe_chars.append(char)
-                    
-                    clean_paragraph = ''.join(safe_chars)
-                    
-                    # Remove extra whitespace
-                    clean_paragraph = re.sub(r'\s+', ' ', clean_paragraph).strip()
-                    
-                    if clean_paragraph:  # Only add non-empty paragraphs
-                        story.append(Paragraph(clean_paragraph, content_style))
-            
-            # Add page break between files (except for the last file)
-            if i < len(txt_files) - 1:
-                story.append(PageBreak())
+    # Read files on worker threads, in order, so the next files are read from disk
+    # while the current one is being cleaned and turned into paragraphs. Only a
+    # window of READ_WORKERS reads is kept in flight, so file contents are not
+    # all held in memory at once.
+    with ThreadPoolExecutor(max_workers=READ_WORKERS) as executor:
+        upcoming_files = iter(txt_files)
+        pending_reads = deque(executor.submit(read_text_file, f) for f in islice(upcoming_files, READ_WORKERS))
+        
+        for i, txt_file in enumerate(txt_files):
+            read_future = pending_reads.popleft()
+            next_file = next(upcoming_files, None)
+            if next_file is not None:
+                pending_reads.append(executor.submit(read_text_file, next_file))
+            try:
+                # Read the text file with better encoding handling
+                content = read_future.result()
                 
-        except Exception as e:
-            print(f"Error processing {txt_file}: {str(e)}")
-            continue
+                # Get filename without path and extension for title
+                filename = os.path.splitext(os.path.basename(txt_file))[0]
+                
+                print(f"Processing: {filename}")
+                
+                # Add filename as title
+                story.append(Paragraph(f"File: {filename}", title_style))
+                story.append(Spacer(1, 12))
+                
+                # Split content into paragraphs and add to story
+                paragraphs = content.split('\n\n')
+                for paragraph in paragraphs:
+                    if paragraph.strip():  # Skip empty paragraphs
+                        # Clean and normalize the text: strip problematic characters and
+                        # apply the standard safe replacements (see _STRIP_RE and _REPL_TABLE)
+                        clean_paragraph = _STRIP_RE.sub('', paragraph.strip()).translate(_REPL_TABLE)
+                        
+                        # Escape XML/HTML special characters for reportlab and
+                        # convert line breaks to HTML breaks in a single pass
+                        clean_paragraph = clean_paragraph.translate(_XML_LINEBREAK)
+                        
+                        # Much more conservative character filtering
+                        # Keep all legitimate Unicode characters including diacritics,
+                        # drop only control/format/private use/unassigned characters
+                        clean_paragraph = clean_paragraph.translate(_DELETE_TABLE)
+                        
+                        # Remove extra whitespace
+                        clean_paragraph = _WS_RE.sub(' ', clean_paragraph).strip()
+                        
+                        if clean_paragraph:  # Only add non-empty paragraphs
+                            add_to_story(Paragraph(clean_paragraph, content_style))
+                
+                # Add page break between files (except for the last file)
+                if i < len(txt_files) - 1:
+                    story.append(PageBreak())
+                    
+            except Exception as e:
+                print(f"Error processing {txt_file}: {str(e)}")
+                continue
     
     # Build PDF
     try:
@@ -6,6 +6,77 @@ import argparse
 import shutil
 import time
 import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+
+# Maximum number of images accepted by a single batch_annotate_images call
+MAX_BATCH_SIZE = 16
+
+# Maximum number of batch requests sent to the Vision API concurrently
+MAX_CONCURRENT_REQUESTS = 16
+
+# Returned when the Vision API detects no text in an image
+NO_TEXT_FOUND = "No text found in image"
+
+# Fewer characters than this from a low-resolution render means the page should be rendered again
+MIN_TEXT_CHARS = 20
+
+def needs_rerender(text):
+    """
+    Check whether text extracted from a low-resolution page render is too sparse to trust
+    
+    Args:
+        text (str): Text returned by the extractor for the image
+        
+    Returns:
+        bool: True if the page should be rendered again at a higher DPI and re-OCR'd
+    """
+    if text.startswith("Error processing image:"):
+        # Failed requests are not a resolution problem
+        return False
+    return text == NO_TEXT_FOUND or len(text.strip()) < MIN_TEXT_CHARS
+
+def read_image(image_path):
+    """Read an image file into memory with a single sized read"""
+    return Path(image_path).read_bytes()
+
+def load_credentials_info(credentials_path_or_json):
+    """
+    Parse service account credentials given either as a file path or as JSON content.
+    
+    Args:
+        credentials_path_or_json (str): Path to the JSON credentials file, or its content
+    
+    Returns:
+        dict: The parsed service account info
+    """
+    if os.path.isfile(credentials_path_or_json):
+        with open(credentials_path_or_json, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    try:
+        return json.loads(credentials_path_or_json)
+    except json.JSONDecodeError:
+        raise FileNotFoundError(f"Credentials file not found: {credentials_path_or_json}")
+
+@lru_cache(maxsize=4)
+def get_vision_client(credentials_path=None):
+    """
+    Create a Vision API client, cached per credentials so the credentials are only
+    parsed and the gRPC channel only set up once. Clients are thread-safe and can be
+    shared between threads.
+    
+    Args:
+        credentials_path (str, optional): Path to the JSON credentials file, or its JSON content.
+                                       If None, will use default service account (for cloud deployment)
+    
+    Returns:
+        vision.ImageAnnotatorClient: The Vision API client
+    """
+    if credentials_path:
+        return vision.ImageAnnotatorClient.from_service_account_info(load_credentials_info(credentials_path))
+    
+    # Use the default service account
+    return vision.ImageAnnotatorClient()
 
 class ImageTextExtractor:
     def __init__(self, credentials_path=None):
@@ -13,22 +84,21 @@ class ImageTextExtractor:
         Initialize the Vision API client
         
         Args:
-            credentials_path (str, optional): Path to the JSON credentials file.
+            credentials_path (str, optional): Path to the JSON credentials file, or its JSON content.
                                            If None, will use default service account (for cloud deployment)
         """
         if credentials_path:
-            # Use provided credentials file (for local development)
-            os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = credentials_path
-            print(f"Using credentials file: {credentials_path}")
+            # Use provided credentials (for local development)
+            if os.path.isfile(credentials_path):
+                print(f"Using credentials file: {credentials_path}")
+            else:
+                print("Using provided credentials JSON")
         else:
             # Use default service account (for cloud deployment)
             print("Using default service account (cloud deployment)")
-            # Clear any existing credentials to use default service account
-            if 'GOOGLE_APPLICATION_CREDENTIALS' in os.environ:
-                del os.environ['GOOGLE_APPLICATION_CREDENTIALS']
         
-        # Initialize the Vision API client
-        self.client = vision.ImageAnnotatorClient()
+        # Initialize the Vision API client, reusing an existing one for the same credentials
+        self.client = get_vision_client(credentials_path)
         
         # Supported image formats
         self.supported_formats = {'.jpg', '.jpeg', '.png', '.bmp', '.gif', '.tiff', '.webp'}
@@ -45,8 +115,7 @@ class ImageTextExtractor:
         """
         try:
             # Read the image file
-            with open(image_path, 'rb') as image_file:
-                content = image_file.read()
+            content = read_image(image_path)
             
             # Create image object
             image = vision.Image(content=content)
@@ -62,18 +131,77 @@ class ImageTextExtractor:
                 extracted_text = texts[0].description
                 return extracted_text
             else:
-                return "No text found in image"
+                return NO_TEXT_FOUND
                 
         except Exception as e:
             return f"Error processing image: {str(e)}"
     
+    def extract_text_batch(self, image_paths):
+        """
+        Extract text from multiple images using batched Vision API requests
+        
+        Args:
+            image_paths (list): Paths to the image files
+            
+        Returns:
+            list: Extracted text for each image, in the same order as image_paths
+        """
+        # Send up to MAX_BATCH_SIZE images per request instead of one request per image
+        chunks = [image_paths[start:start + MAX_BATCH_SIZE] for start in range(0, len(image_paths), MAX_BATCH_SIZE)]
+        if not chunks:
+            return []
+        
+        # Requests are network-bound, so several batches can be in flight at once
+        chunk_results = [None] * len(chunks)
+        with ThreadPoolExecutor(max_workers=min(MAX_CONCURRENT_REQUESTS, len(chunks))) as executor:
+            futures = {executor.submit(self.annotate_batch, chunk): index for index, chunk in enumerate(chunks)}
+            for future in as_completed(futures):
+                chunk_results[futures[future]] = future.result()
+        
+        return [text for texts in chunk_results for text in texts]
+    
+    def annotate_batch(self, image_paths):
+        """
+        Extract text from up to MAX_BATCH_SIZE images with a single batch_annotate_images request
+        
+        Args:
+            image_paths (list): Paths to the image files
+            
+        Returns:
+            list: Extracted text for each image, in the same order as image_paths
+        """
+        try:
+            annotate_requests = [
+                vision.AnnotateImageRequest(
+                    image=vision.Image(content=read_image(image_path)),
+                    features=[vision.Feature(type_=vision.Feature.Type.TEXT_DETECTION)]
+                )
+                for image_path in image_paths
+            ]
+            
+            response = self.client.batch_annotate_images(requests=annotate_requests)
+            
+            results = []
+            for image_response in response.responses:
+                if image_response.error.message:
+                    results.append(f"Error processing image: {image_response.error.message}")
+                elif image_response.text_annotations:
+                    # The first annotation contains all detected text
+                    results.append(image_response.text_annotations[0].description)
+                else:
+                    results.append(NO_TEXT_FOUND)
+            return results
+                    
+        except Exception as e:
+            return [f"Error processing image: {str(e)}"] * len(image_paths)
+    
     def process_folder(self, folder_path, output_format='txt'):
         """
         Process all images in a folder and extract text
         
         Args:
             folder_path (str): Path to the folder containing images
-            output_format (str): Output format - 'txt', 'json', or 'console'
+            output_format (str): Output format - 'txt', 'combined_txt', 'json', or 'console'
         """
         folder_path = Path(folder_path)
         
@@ -81,11 +209,13 @@ class ImageTextExtractor:
             print(f"Error: Folder '{folder_path}' does not exist")
             return
         
-        # Get all image files in the folder
-        image_files = []
-        for file_path in folder_path.iterdir():
-            if file_path.is_file() and file_path.suffix.lower() in self.supported_formats:
-                image_files.append(file_path)
+        # Get all image files in the folder; DirEntry.is_file() uses the type
+        # returned by the directory listing, avoiding a stat() per entry
+        with os.scandir(folder_path) as entries:
+            image_files = [
+                Path(entry.path) for entry in entries
+                if entry.is_file() and os.path.splitext(entry.name)[1].lower() in self.supported_formats
+            ]
         
         if not image_files:
             print(f"No supported image files found in '{folder_path}'")
@@ -96,11 +226,11 @@ class ImageTextExtractor:
         
         results = {}
         
-        # Process each image
-        for i, image_path in enumerate(image_files, 1):
-            print(f"Processing ({i}/{len(image_files)}): {image_path.name}")
-            
-            extracted_text = self.extract_text_from_image(str(image_path))
+        # Process the images in batched Vision requests
+        print(f"Processing {len(image_files)} images in batches of up to {MAX_BATCH_SIZE}...")
+        extracted_texts = self.extract_text_batch([str(image_path) for image_path in image_files])
+        
+        for image_path, extracted_text in zip(image_files, extracted_texts):
             results[image_path.name] = extracted_text
             
             if output_format == 'console':
@@ -111,6 +241,8 @@ class ImageTextExtractor:
         # Save results based on output format
         if output_format == 'txt':
             self.save_as_txt(results, folder_path)
+        elif output_format == 'combined_txt':
+            self.save_as_combined_txt(results, folder_path)
         elif output_format == 'json':
             self.save_as_json(results, folder_path)
         
@@ -127,13 +259,22 @@ class ImageTextExtractor:
             output_path = output_folder / output_filename
             
             # Write text to file
-            with open(output_path, 'w', encoding='utf-8') as f:
-                f.write(f"Text extracted from: {image_name}\n")
-                f.write("=" * 50 + "\n\n")
-                f.write(text)
+            with open(output_path, 'w', encoding='utf-8', buffering=1 << 16) as f:
+                f.write(f"Text extracted from: {image_name}\n{'=' * 50}\n\n{text}")
             
             print(f"Saved: {output_path}")
     
+    def save_as_combined_txt(self, results, folder_path):
+        """Save results as a single text file, one section per image"""
+        output_path = folder_path / "all_text.txt"
+        
+        # One large buffered writer instead of an open/close per image
+        with open(output_path, 'w', encoding='utf-8', buffering=1 << 20) as f:
+            for image_name, text in results.items():
+                f.write(f"Text extracted from: {image_name}\n{'=' * 50}\n\n{text}\n\n")
+        
+        print(f"Saved: {output_path}")
+    
     def save_as_json(self, results, folder_path):
         """Save results as a single JSON file"""
         output_path = folder_path / "extracted_text_results.json"
@@ -147,7 +288,7 @@ def main():
     parser = argparse.ArgumentParser(description='Extract text from images using Google Vision API')
     parser.add_argument('folder_path', help='Path to folder containing images')
     parser.add_argument('credentials_path', help='Path to Google Cloud credentials JSON file')
-    parser.add_argument('--output', choices=['txt', 'json', 'console'], default='txt',
+    parser.add_argument('--output', choices=['txt', 'combined_txt', 'json', 'console'], default='txt',
                        help='Output format (default: txt)')
     
     args = parser.parse_args()